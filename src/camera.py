@@ -0,0 +1,442 @@
+import os
+import time
+import struct
+import asyncio
+import logging
+import subprocess
+import threading
+from multiprocessing import shared_memory, resource_tracker
+
+# Support both package and direct execution
+try:
+    from .config import Config
+except ImportError:
+    from config import Config
+
+logger = logging.getLogger(__name__)
+
+# libjpeg-turbo's SIMD encoder for the live view; fall back to OpenCV's
+# imencode if PyTurboJPEG or the shared library isn't available
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420, TJFLAG_FASTDCT
+    turbojpeg = TurboJPEG()
+except (ImportError, OSError):
+    turbojpeg = None
+
+# Rate frames are decoded and published at; matches what /video_feed sends
+STREAM_FPS = 15
+FRAME_INTERVAL = 1 / STREAM_FPS
+
+# "ffmpeg" decodes and JPEG-encodes inside one (hardware-accelerated where
+# possible) ffmpeg process; "opencv" is the in-process cv2 pipeline;
+# "snapshot" polls JPEGs the camera encodes itself, so nothing is decoded here
+LIVE_VIEW_BACKEND = os.getenv("LIVE_VIEW_BACKEND", "ffmpeg")
+
+# Poll rate of the snapshot backend; a camera-side encode per request
+SNAPSHOT_FPS = 2
+# Consecutive snapshot failures, before any success, that mean the camera
+# has no snapshot API; the ffmpeg backend takes over
+SNAPSHOT_MAX_FAILURES = 3
+
+# With no viewer for this long the capture thread drops the stream and stops
+# decoding/encoding until someone opens the live view again
+VIEWER_IDLE_SECONDS = 5
+
+# Live-view frame size (width, height); the camera's substream is usually
+# already this size, so frames are only scaled when they are larger
+LIVE_VIEW_SIZE = (640, 360)
+# JPEG quality of frames encoded in-process by the opencv backend
+LIVE_VIEW_JPEG_QUALITY = 60
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+class FrameSource:
+    """Latest live-view JPEG plus the plumbing that wakes /video_feed clients."""
+
+    def __init__(self):
+        # (jpeg_bytes, publish_time), replaced as a whole by the producer.
+        # Rebinding one attribute is atomic, so readers never take a lock and
+        # always see a frame together with its own timestamp.
+        self.latest = (None, 0.0)
+        # Set (and replaced) on the event loop each time a frame is published,
+        # waking every /video_feed client at once
+        self.loop = None
+        self.frame_event = asyncio.Event()
+        # Touched by every frame request; set while someone is watching
+        self.last_viewer_time = 0.0
+        self.viewer_event = threading.Event()
+
+    def attach_loop(self, loop):
+        """Registers the server's event loop so the producer can wake streaming clients."""
+        self.loop = loop
+
+    def _notify_frame(self):
+        # Runs on the event loop thread
+        event, self.frame_event = self.frame_event, asyncio.Event()
+        event.set()
+
+    def mark_viewer(self, when=None):
+        """Records that someone is watching (time.monotonic(), shared across processes)."""
+        self.last_viewer_time = time.monotonic() if when is None else when
+        self.viewer_event.set()
+
+    def _publish(self, jpeg, frame_time=None):
+        self.latest = (jpeg, time.time() if frame_time is None else frame_time)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._notify_frame)
+
+    def get_frame(self):
+        # Return the last known frame
+        self.mark_viewer()
+        frame, frame_time = self.latest
+        if frame and (time.time() - frame_time) < 5:
+            return frame
+        return None
+
+    async def next_frame(self, timeout=1.0):
+        """Waits for the next published frame (or timeout) and returns the latest one."""
+        try:
+            await asyncio.wait_for(self.frame_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.get_frame()
+
+class VideoCamera(FrameSource):
+    """Captures the camera substream in a background thread.
+
+    sink, if given, is also called with every published JPEG (the capture
+    daemon uses it to fill shared memory).
+    """
+
+    def __init__(self, sink=None):
+        super().__init__()
+        self.sink = sink
+        target = {
+            "opencv": self._capture_loop,
+            "snapshot": self._snapshot_capture_loop,
+        }.get(LIVE_VIEW_BACKEND, self._ffmpeg_capture_loop)
+        self.thread = threading.Thread(target=target, daemon=True)
+        self.thread.start()
+
+    def _has_viewers(self):
+        if time.monotonic() - self.last_viewer_time < VIEWER_IDLE_SECONDS:
+            return True
+        self.viewer_event.clear()
+        return False
+
+    def _wait_for_viewer(self):
+        """Blocks the capture thread until a client asks for frames."""
+        while not self._has_viewers():
+            self.viewer_event.wait()
+
+    def _publish(self, jpeg, frame_time=None):
+        frame_time = time.time() if frame_time is None else frame_time
+        super()._publish(jpeg, frame_time)
+        if self.sink is not None:
+            self.sink(jpeg, frame_time)
+
+    def _snapshot_capture_loop(self):
+        """Publishes the camera's own JPEG snapshots; no decode or encode at all."""
+        import requests
+        logger.info("Starting snapshot capture loop...")
+        session = requests.Session()
+        ever_succeeded = False
+        failures = 0
+        while True:
+            self._wait_for_viewer()
+            started = time.monotonic()
+            try:
+                response = session.get(Config.get_snapshot_url(*LIVE_VIEW_SIZE), timeout=2)
+                if response.status_code != 200 or not response.content.startswith(JPEG_SOI):
+                    raise ValueError(f"no JPEG in snapshot response (HTTP {response.status_code})")
+                self._publish(response.content)
+                ever_succeeded = True
+                failures = 0
+            except Exception as e:
+                failures += 1
+                # Only our own no-JPEG error is safe to print: requests' messages
+                # (InvalidURL is a ValueError too) embed the URL, and with it the
+                # camera password
+                reason = e if type(e) is ValueError else type(e).__name__
+                logger.warning(f"Snapshot failed: {reason}")
+                if not ever_succeeded and failures >= SNAPSHOT_MAX_FAILURES:
+                    logger.error("Camera snapshots unavailable; falling back to the ffmpeg live view")
+                    session.close()
+                    return self._ffmpeg_capture_loop()
+                time.sleep(2)
+            time.sleep(max(0.0, 1 / SNAPSHOT_FPS - (time.monotonic() - started)))
+
+    def _ffmpeg_capture_loop(self):
+        """Publishes the JPEG frames of an ffmpeg MJPEG pipe; no decoding in Python."""
+        logger.info("Starting ffmpeg capture loop...")
+        while True:
+            self._wait_for_viewer()
+            process = None
+            try:
+                cmd = [
+                    "ffmpeg",
+                    "-nostdin",
+                    "-loglevel", "error",
+                    "-hwaccel", "auto",
+                    "-rtsp_transport", "tcp",
+                    "-timeout", "5000000",
+                    # Don't buffer input ahead of decode; the live view wants the newest frame
+                    "-fflags", "nobuffer",
+                    "-flags", "low_delay",
+                    "-i", Config.get_rtsp_substream_url(),
+                    "-an",
+                    # scale is a passthrough when the substream already matches
+                    "-vf", f"fps={STREAM_FPS},scale={LIVE_VIEW_SIZE[0]}:{LIVE_VIEW_SIZE[1]}",
+                    "-q:v", "5",
+                    "-f", "mjpeg",
+                    "pipe:1"
+                ]
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+                buf = b""
+                while True:
+                    chunk = process.stdout.read1(65536)
+                    if not chunk:
+                        logger.warning("ffmpeg live stream ended. Reconnecting...")
+                        break
+                    if not self._has_viewers():
+                        logger.info("No live viewers; stopping ffmpeg capture")
+                        break
+                    buf += chunk
+
+                    # Split complete JPEGs out of the byte stream (SOI ... EOI)
+                    start = buf.find(JPEG_SOI)
+                    while start != -1:
+                        end = buf.find(JPEG_EOI, start + 2)
+                        if end == -1:
+                            break
+                        self._publish(buf[start:end + 2])
+                        buf = buf[end + 2:]
+                        start = buf.find(JPEG_SOI)
+                    if start == -1:
+                        buf = b""
+                    elif start > 0:
+                        buf = buf[start:]
+            except Exception as e:
+                logger.error(f"Error in ffmpeg capture loop: {e}")
+            finally:
+                if process is not None and process.poll() is None:
+                    process.kill()
+                    process.wait()
+            
+            if self._has_viewers():
+                time.sleep(2) # Wait before reconnecting
+
+    def _capture_loop(self):
+        # Must be set before the first VideoCapture: RTSP over TCP with a small,
+        # low-delay demuxer buffer, so stale frames don't pile up ahead of grab()
+        os.environ.setdefault(
+            "OPENCV_FFMPEG_CAPTURE_OPTIONS",
+            "rtsp_transport;tcp|buffer_size;102400|fflags;nobuffer|flags;low_delay"
+        )
+        import cv2
+        # Built once; only used when PyTurboJPEG is unavailable
+        imencode_params = [cv2.IMWRITE_JPEG_QUALITY, LIVE_VIEW_JPEG_QUALITY]
+        logger.info("Starting video capture loop...")
+        while True:
+            self._wait_for_viewer()
+            try:
+                url = Config.get_rtsp_substream_url()
+                # Ask FFmpeg for any available hardware decoder (VAAPI/QSV/V4L2...);
+                # OpenCV falls back to software decode when there is none
+                hw_params = []
+                if hasattr(cv2, "CAP_PROP_HW_ACCELERATION"):
+                    hw_params = [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+                cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, hw_params)
+                # Keep OpenCV's internal queue short so we always serve a recent frame
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                
+                if not cap.isOpened():
+                    logger.error("Failed to open RTSP stream") # URL carries credentials
+                    time.sleep(5)
+                    continue
+                if hw_params:
+                    hw_accel = int(cap.get(cv2.CAP_PROP_HW_ACCELERATION))
+                    logger.info(f"Live view capture via {cap.getBackendName()}, hw acceleration mode {hw_accel}")
+
+                next_publish = 0.0
+                while True:
+                    # grab() demuxes without decoding; only decode frames we will publish
+                    if not cap.grab():
+                        logger.warning("Failed to read frame from stream. Reconnecting...")
+                        break
+
+                    now = time.monotonic()
+                    if now < next_publish:
+                        continue
+                    next_publish = now + FRAME_INTERVAL
+                    if not self._has_viewers():
+                        logger.info("No live viewers; releasing video capture")
+                        break
+
+                    success, frame = cap.retrieve()
+                    if not success:
+                        continue
+                    
+                    # Resize (only if the substream is larger) and encode once
+                    height, width = frame.shape[:2]
+                    if width > LIVE_VIEW_SIZE[0] or height > LIVE_VIEW_SIZE[1]:
+                        frame = cv2.resize(frame, LIVE_VIEW_SIZE, interpolation=cv2.INTER_AREA)
+                    if turbojpeg is not None:
+                        # Fast integer DCT: the accuracy loss is invisible at this quality
+                        jpeg = turbojpeg.encode(frame, quality=LIVE_VIEW_JPEG_QUALITY, pixel_format=TJPF_BGR,
+                                                jpeg_subsample=TJSAMP_420, flags=TJFLAG_FASTDCT)
+                    else:
+                        ret, buffer = cv2.imencode('.jpg', frame, imencode_params)
+                        jpeg = buffer.tobytes() if ret else None
+                    
+                    if jpeg:
+                        self._publish(jpeg)
+
+                cap.release()
+            except Exception as e:
+                logger.error(f"Error in video capture loop: {e}")
+            
+            if self._has_viewers():
+                time.sleep(2) # Wait before reconnecting
+
+# --- Shared-memory frame channel ---
+#
+# Lets one capture process (capture_daemon.py) feed any number of web worker
+# processes. Layout of the segment:
+#   0:  seq (u64)         odd while the writer is mid-update (seqlock)
+#   8:  frame_time (f64)  time.time() of the frame
+#   16: length (u32)      JPEG size in bytes
+#   24: viewer_time (f64) time.monotonic() of the last frame request, by any reader
+#   32: JPEG bytes
+SHM_FRAME_NAME = os.getenv("SHM_FRAME_NAME", "catcam_frame")
+SHM_FRAME_SIZE = 512 * 1024
+_SEQ = struct.Struct("<Q")
+_FRAME_HEADER = struct.Struct("<QdI")
+_VIEWER_TIME = struct.Struct("<d")
+_VIEWER_TIME_OFFSET = 24
+_DATA_OFFSET = 32
+# A reader with a viewer but no new frame for this long reattaches, in case
+# the daemon replaced the segment
+SHM_REATTACH_SECONDS = 5
+
+def _open_segment(name, create=False, size=0):
+    """Opens the segment so that it outlives this process.
+
+    multiprocessing's resource tracker would otherwise unlink it when the
+    process exits, stranding the other side on a deleted segment.
+    """
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    if os.name == "posix":
+        resource_tracker.unregister("/" + shm.name, "shared_memory")
+    return shm
+
+class SharedFrameWriter:
+    """Publishes JPEGs into the shared-memory segment.
+
+    The segment is kept across daemon restarts, so web workers that are
+    already attached keep reading frames and reporting viewers.
+    """
+
+    def __init__(self, name=SHM_FRAME_NAME, size=SHM_FRAME_SIZE):
+        try:
+            self.shm = _open_segment(name)
+            if self.shm.size < size:
+                # Too small for this build's frames; replace it (readers reattach)
+                self.shm.close()
+                self.shm.unlink()
+                raise FileNotFoundError
+        except FileNotFoundError:
+            self.shm = _open_segment(name, create=True, size=size)
+            _FRAME_HEADER.pack_into(self.shm.buf, 0, 0, 0.0, 0)
+            _VIEWER_TIME.pack_into(self.shm.buf, _VIEWER_TIME_OFFSET, 0.0)
+        self.buf = self.shm.buf
+        self.capacity = size - _DATA_OFFSET
+        # Continue the previous run's seq so readers never see one repeat; an
+        # odd seq (that run died mid-write) stays odd until the next frame
+        seq = _SEQ.unpack_from(self.buf, 0)[0]
+        self.seq = seq + (seq & 1)
+
+    def write(self, jpeg, frame_time):
+        size = len(jpeg)
+        if size > self.capacity:
+            logger.warning(f"Live-view frame of {size} bytes exceeds shared memory; dropped")
+            return
+        # Odd seq tells readers the frame is being rewritten
+        _SEQ.pack_into(self.buf, 0, self.seq + 1)
+        self.buf[_DATA_OFFSET:_DATA_OFFSET + size] = jpeg
+        self.seq += 2
+        _FRAME_HEADER.pack_into(self.buf, 0, self.seq, frame_time, size)
+
+    def viewer_time(self):
+        return _VIEWER_TIME.unpack_from(self.buf, _VIEWER_TIME_OFFSET)[0]
+
+    def close(self):
+        # Not unlinked: the next daemon run reuses it
+        self.buf = None
+        self.shm.close()
+
+class SharedMemoryCamera(FrameSource):
+    """Frame source for web workers when capture runs in capture_daemon.py."""
+
+    def __init__(self, name=SHM_FRAME_NAME):
+        super().__init__()
+        self.name = name
+        self.shm = None
+        self.seq = 0
+        self.last_frame_time = 0.0
+
+    def _attach(self):
+        try:
+            self.shm = _open_segment(self.name)
+        except FileNotFoundError:
+            return False
+        self.last_frame_time = time.monotonic()
+        # Carry over a viewer that arrived while we were detached
+        _VIEWER_TIME.pack_into(self.shm.buf, _VIEWER_TIME_OFFSET, self.last_viewer_time)
+        return True
+
+    def _detach(self):
+        self.shm.close()
+        self.shm = None
+
+    def attach_loop(self, loop):
+        super().attach_loop(loop)
+        loop.create_task(self._poll())
+
+    def mark_viewer(self, when=None):
+        super().mark_viewer(when)
+        if self.shm is not None:
+            _VIEWER_TIME.pack_into(self.shm.buf, _VIEWER_TIME_OFFSET, self.last_viewer_time)
+
+    def _read(self):
+        """Returns (seq, frame_time, jpeg) for a new, consistent frame, else None."""
+        buf = self.shm.buf
+        for _ in range(3):
+            seq, frame_time, size = _FRAME_HEADER.unpack_from(buf, 0)
+            if seq == self.seq or seq & 1:
+                return None
+            jpeg = bytes(buf[_DATA_OFFSET:_DATA_OFFSET + size])
+            if _SEQ.unpack_from(buf, 0)[0] == seq:
+                return seq, frame_time, jpeg
+        return None # Writer kept overtaking us; try again next poll
+
+    async def _poll(self):
+        # One poller per process copies each new frame once for all its viewers
+        while True:
+            if self.shm is None and not self._attach():
+                await asyncio.sleep(1)
+                continue
+            frame = self._read()
+            now = time.monotonic()
+            if frame is not None:
+                self.seq, frame_time, jpeg = frame
+                self.last_frame_time = now
+                self._publish(jpeg, frame_time)
+            elif (now - self.last_viewer_time < VIEWER_IDLE_SECONDS
+                    and now - self.last_frame_time > SHM_REATTACH_SECONDS):
+                # Watched but starved: the segment may be an orphan
+                self._detach()
+                continue
+            await asyncio.sleep(FRAME_INTERVAL / 2)
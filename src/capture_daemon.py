@@ -0,0 +1,36 @@
+import sys
+import time
+import logging
+
+# Support both package and direct execution
+try:
+    from .camera import VideoCamera, SharedFrameWriter
+except ImportError:
+    from camera import VideoCamera, SharedFrameWriter
+
+def main():
+    """
+    Owns the single RTSP live-view capture and publishes its JPEGs to shared
+    memory. Web workers started with LIVE_VIEW_SOURCE=shm read from there.
+    """
+    # Flush stdout for Docker logs
+    sys.stdout.reconfigure(line_buffering=True)
+    logging.basicConfig(level=logging.INFO)
+
+    writer = SharedFrameWriter()
+    camera = VideoCamera(sink=writer.write)
+    print("Live-view capture daemon started.")
+
+    try:
+        while True:
+            # Readers stamp the shared viewer time; hand it to the capture
+            # thread so it only decodes while someone is watching
+            viewer_time = writer.viewer_time()
+            if viewer_time > camera.last_viewer_time:
+                camera.mark_viewer(viewer_time)
+            time.sleep(0.5)
+    finally:
+        writer.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,58 @@
 import os
+import re
 from pathlib import Path
+from urllib.parse import urlencode
+
+# Use /config if it exists (Docker), otherwise use local ./config.
+# Probed once at import.
+CONFIG_DIR = Path("/config") if Path("/config").exists() else Path("config")
+
+# Segment filenames as written by the recorder ("%p-%I-%M-%S.mp4")
+SEGMENT_NAME_RE = re.compile(r'(AM|PM)-(\d\d)-(\d\d)-(\d\d)\.mp4')
+
+def parse_segment_seconds(name):
+    """Returns the time of day encoded in a segment filename (PM-01-18-00.mp4)
+    as seconds since midnight, or None.
+
+    Hand-rolled because strptime re-interprets its format string on every
+    call, and the dashboard and timelapse parse every segment of a day.
+    """
+    m = SEGMENT_NAME_RE.fullmatch(name)
+    if m is None:
+        return None
+    hour, minute, second = int(m[2]), int(m[3]), int(m[4])
+    if not (1 <= hour <= 12 and minute < 60 and second < 60):
+        return None
+    return (hour % 12 + (12 if m[1] == "PM" else 0)) * 3600 + minute * 60 + second
 
 class Config:
-    # Storage
     # Storage
     BOX_ROOT = Path("/data/box")
-    
-    # Use /config if it exists (Docker), otherwise use local ./config
-    if Path("/config").exists():
-        CONFIG_DIR = Path("/config")
-    else:
-        CONFIG_DIR = Path("config")
-        
+
+    CONFIG_DIR = CONFIG_DIR
     SETTINGS_FILE = CONFIG_DIR / "settings.env"
 
+    # Parsed settings, keyed by the settings file's (mtime_ns, size)
+    _cache = None
+    _cache_key = None
+
     @classmethod
     def load(cls):
-        """Loads settings from file, overriding defaults."""
+        """Loads settings from file, overriding defaults. Only re-parses when the file changes."""
+        return dict(cls._settings())
+
+    @classmethod
+    def _settings(cls):
+        """The cached settings dict itself; callers must not mutate it."""
+        try:
+            st = cls.SETTINGS_FILE.stat()
+            key = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key = None
+
+        if cls._cache is not None and cls._cache_key == key:
+            return cls._cache
+
         defaults = {
             "SUBFOLDER": os.getenv("SUBFOLDER", "Other/CatCam"),
             "SEGMENT_TIME": os.getenv("SEGMENT_TIME", "900"),
@@ -27,7 +63,7 @@ class Config:
             "ENABLE_AUDIO": os.getenv("ENABLE_AUDIO", "True"),
         }
         
-        if cls.SETTINGS_FILE.exists():
+        if key is not None:
             with open(cls.SETTINGS_FILE, "r") as f:
                 for line in f:
                     line = line.strip()
@@ -38,9 +74,36 @@ class Config:
                         if k:
                             defaults[k] = v
         
+        cls._cache = defaults
+        cls._cache_key = key
         return defaults
 
+    @classmethod
+    def settings_mtime(cls):
+        """mtime of the settings file (0 if missing), with a single stat."""
+        try:
+            return cls.SETTINGS_FILE.stat().st_mtime
+        except FileNotFoundError:
+            return 0
+
     @classmethod
     def get_rtsp_url(cls):
-        conf = cls.load()
+        conf = cls._settings()
         return f"rtsp://{conf['CAMERA_USER']}:{conf['CAMERA_PASS']}@{conf['CAMERA_IP']}:554/h264Preview_01_main"
+
+    @classmethod
+    def get_snapshot_url(cls, width=640, height=360):
+        """Camera-encoded JPEG snapshot (Reolink CGI API), scaled on the camera."""
+        conf = cls._settings()
+        query = urlencode({
+            "cmd": "Snap", "channel": 0, "rs": "catcam",
+            "user": conf["CAMERA_USER"], "password": conf["CAMERA_PASS"],
+            "width": width, "height": height,
+        })
+        return f"http://{conf['CAMERA_IP']}/cgi-bin/api.cgi?{query}"
+
+    @classmethod
+    def get_rtsp_substream_url(cls):
+        """Low-resolution substream; plenty for the web live view and far cheaper to decode."""
+        conf = cls._settings()
+        return f"rtsp://{conf['CAMERA_USER']}:{conf['CAMERA_PASS']}@{conf['CAMERA_IP']}:554/h264Preview_01_sub"
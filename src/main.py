@@ -1,23 +1,33 @@
 import os
 import re
-import shutil
+import asyncio
+import functools
+import hashlib
+import socket
 import time
 import subprocess
 import threading
 import logging
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, time as dt_time
 from pathlib import Path
-from fastapi import FastAPI, Request, Form, BackgroundTasks
+from urllib.parse import quote
+import numpy as np
+import orjson
+from fastapi import FastAPI, Request, Form
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import Response, StreamingResponse, HTMLResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+from jinja2 import FileSystemBytecodeCache
 
 # Support both package and direct execution
 try:
-    from .config import Config
+    from .config import Config, parse_segment_seconds
+    from .camera import VideoCamera, SharedMemoryCamera
     from .timelapse import generate_timelapse, generate_timelapse_range, MAX_SPEED_MULTIPLIER
 except ImportError:
-    from config import Config
+    from config import Config, parse_segment_seconds
+    from camera import VideoCamera, SharedMemoryCamera
     from timelapse import generate_timelapse, generate_timelapse_range, MAX_SPEED_MULTIPLIER
 
 # Configure logging
@@ -26,9 +36,18 @@ logger = logging.getLogger(__name__)
 
 # --- Security Helpers ---
 
+# Resolved once; every file-serving request compares against it
+BOX_ROOT_RESOLVED = Config.BOX_ROOT.resolve()
+
+# When set (e.g. "/_protected"), /play_file hands recordings to a reverse
+# proxy via X-Accel-Redirect instead of streaming them through Python
+XACCEL_PREFIX = os.getenv("XACCEL_PREFIX", "").rstrip("/")
+
+DATE_PARAM_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
 def validate_date_param(date_str: str) -> bool:
     """Validates date parameter matches YYYY-MM-DD format and is a valid date."""
-    if not re.match(r'^\d{4}-\d{2}-\d{2}$', date_str):
+    if not DATE_PARAM_RE.match(date_str):
         return False
     try:
         datetime.strptime(date_str, '%Y-%m-%d')
@@ -36,199 +55,222 @@ def validate_date_param(date_str: str) -> bool:
     except ValueError:
         return False
 
+@functools.lru_cache(maxsize=256)
+def resolve_box_path(rel_path: str):
+    """Resolves rel_path under BOX_ROOT, or None if it escapes it.
+
+    strict=True makes the resolve double as the existence check; a missing
+    file raises FileNotFoundError (an OSError), which is never cached. Found
+    paths are cached, since a player issues many Range requests per file.
+    """
+    path = (Config.BOX_ROOT / rel_path).resolve(strict=True)
+    if not path.is_relative_to(BOX_ROOT_RESOLVED):
+        return None
+    return path
+
+def render_json(content) -> bytes:
+    """Serializes with orjson (C encoder); NumPy arrays and scalars are accepted as-is."""
+    return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
 def get_version():
     """Gets version string from git commit count and short hash."""
     try:
-        # Get commit count
-        count = subprocess.run(
-            ["git", "rev-list", "--count", "HEAD"],
-            capture_output=True, text=True, cwd=Path(__file__).parent.parent
-        )
-        # Get short hash
-        hash_result = subprocess.run(
-            ["git", "rev-parse", "--short", "HEAD"],
-            capture_output=True, text=True, cwd=Path(__file__).parent.parent
+        # One git process: every commit's short hash, newest first, so the
+        # first line is HEAD and the line count is the commit count
+        result = subprocess.run(
+            ["git", "rev-list", "--abbrev-commit", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent.parent,
+            check=False, timeout=2
         )
         
-        if count.returncode == 0 and hash_result.returncode == 0:
-            return f"v{count.stdout.strip()}.{hash_result.stdout.strip()}"
+        hashes = result.stdout.split()
+        if result.returncode == 0 and hashes:
+            return f"v{len(hashes)}.{hashes[0]}"
     except Exception:
         pass
     return "dev"
 
-app = FastAPI()
+# The checkout can't change under a running server, so ask git only once
+VERSION = get_version()
+
+app = FastAPI(default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="src/templates")
+# Persist compiled template bytecode so restarts skip recompiling index.html
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+
+# The dashboard page is static (live data comes from /api/stats), so it is
+# rendered once and served from memory
+_dashboard_page = {}
+
+def get_dashboard_page():
+    """Returns (html_bytes, etag) for the dashboard, rendering it on first use."""
+    if not _dashboard_page:
+        html = templates.get_template("index.html").render(page="dashboard").encode()
+        _dashboard_page["html"] = html
+        _dashboard_page["etag"] = f'"{hashlib.blake2s(html, digest_size=8).hexdigest()}"'
+    return _dashboard_page["html"], _dashboard_page["etag"]
+
+# Listing pages are revalidated rather than re-rendered when nothing changed
+LISTING_CACHE_CONTROL = "max-age=10, must-revalidate"
+
+def page_etag(*parts):
+    """ETag for a page rendered from `parts`; includes the template's own tag so deploys invalidate it."""
+    digest = hashlib.blake2s(repr((get_dashboard_page()[1],) + parts).encode(), digest_size=8)
+    return f'"{digest.hexdigest()}"'
+
+def render_listing(request, etag, context):
+    """Renders index.html with ETag headers, or answers 304 if the client's copy is current."""
+    headers = {"Cache-Control": LISTING_CACHE_CONTROL, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return templates.TemplateResponse("index.html", {"request": request, **context}, headers=headers)
 
 # --- Singleton Video Camera ---
-class VideoCamera:
-    def __init__(self):
-        self.frame = None
-        self.last_frame_time = 0
-        self.lock = threading.Lock()
-        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
-        self.thread.start()
-
-    def _capture_loop(self):
-        import cv2
-        logger.info("Starting video capture loop...")
-        while True:
-            try:
-                url = Config.get_rtsp_url()
-                cap = cv2.VideoCapture(url)
-                
-                if not cap.isOpened():
-                    logger.error(f"Failed to open RTSP stream: {url}")
-                    time.sleep(5)
-                    continue
-
-                while True:
-                    success, frame = cap.read()
-                    if not success:
-                        logger.warning("Failed to read frame from stream. Reconnecting...")
-                        break
-                    
-                    # Resize and encode once
-                    frame = cv2.resize(frame, (640, 360))
-                    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 60])
-                    
-                    if ret:
-                        with self.lock:
-                            self.frame = buffer.tobytes()
-                            self.last_frame_time = time.time()
-                    
-                    # Limit capture rate to ~15fps to save CPU if needed, 
-                    # but blocking read() usually handles timing.
-                    # time.sleep(0.05) 
-
-                cap.release()
-            except Exception as e:
-                logger.error(f"Error in video capture loop: {e}")
-            
-            time.sleep(2) # Wait before reconnecting
 
-    def get_frame(self):
-        # Return the last known frame
-        with self.lock:
-            if self.frame and (time.time() - self.last_frame_time) < 5:
-                return self.frame
-        return None
+# multipart/x-mixed-replace framing around each /video_feed JPEG
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+MJPEG_PART_TRAILER = b"\r\n"
+
+# "local" captures in this process; "shm" reads frames that
+# capture_daemon.py publishes to shared memory, so several uvicorn workers
+# share one RTSP connection and one decode
+LIVE_VIEW_SOURCE = os.getenv("LIVE_VIEW_SOURCE", "local")
 
 # Global camera instance
-camera = VideoCamera()
+camera = SharedMemoryCamera() if LIVE_VIEW_SOURCE == "shm" else VideoCamera()
+
+@app.on_event("startup")
+async def attach_camera_loop():
+    camera.attach_loop(asyncio.get_running_loop())
 
 # --- Helpers ---
 
+def read_small_file(path, size):
+    """Reads up to `size` bytes of a procfs/sysfs file with a single pread."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.pread(fd, size, 0)
+    finally:
+        os.close(fd)
+
 def get_disk_usage():
     """Checks disk usage of the mini PC's root filesystem."""
     try:
         # Measure the mini PC's root filesystem to ensure videos aren't filling up local disk
-        total, used, free = shutil.disk_usage("/")
+        st = os.statvfs("/")
+        total = st.f_blocks * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
         percent_used = (used / total) * 100
         return {"percent": round(percent_used, 1), "free_gb": round(free / (1024**3), 1)}
     except Exception:
         return {"percent": 0, "free_gb": 0}
 
+# The CPU thermal zone never changes while we run, so it is looked up once
+# and its temp file kept open; each reading is then a single pread
+_temp_fd = {"fd": None, "resolved": False}
+
+def resolve_temp_path():
+    """Finds the temp file of the thermal zone that best represents the CPU, or None."""
+    base = Path("/sys/class/thermal")
+    if not base.exists():
+        return None
+
+    # Preferred zones that usually represent the CPU core/package
+    preferred_types = ["x86_pkg_temp", "coretemp", "k10temp", "cpu-thermal"]
+
+    # 1. Scan for a preferred zone
+    for z in base.glob("thermal_zone*"):
+        try:
+            if read_small_file(z / "type", 64).decode().strip() in preferred_types:
+                return z / "temp"
+        except OSError:
+            continue
+
+    # 2. Fallback to thermal_zone0 (original behavior)
+    tz0 = base / "thermal_zone0" / "temp"
+    return tz0 if tz0.exists() else None
+
 def get_cpu_temp():
     """Reads Linux thermal zone (mounted read-only)."""
     try:
-        base = Path("/sys/class/thermal")
-        if not base.exists():
+        if not _temp_fd["resolved"]:
+            temp_path = resolve_temp_path()
+            if temp_path is not None:
+                _temp_fd["fd"] = os.open(temp_path, os.O_RDONLY)
+            _temp_fd["resolved"] = True
+        if _temp_fd["fd"] is None:
             return "--"
-
-        # Preferred zones that usually represent the CPU core/package
-        preferred_types = ["x86_pkg_temp", "coretemp", "k10temp", "cpu-thermal"]
-        
-        # 1. Scan for a preferred zone
-        for z in base.glob("thermal_zone*"):
-            try:
-                type_path = z / "type"
-                if type_path.exists():
-                    z_type = type_path.read_text().strip()
-                    if z_type in preferred_types:
-                        # Found a good one!
-                        temp_c = int((z / "temp").read_text().strip()) / 1000
-                        return f"{temp_c * 9/5 + 32:.1f}°F"
-            except: continue
-
-        # 2. Fallback to thermal_zone0 (original behavior)
-        tz0 = base / "thermal_zone0" / "temp"
-        if tz0.exists():
-            temp_c = int(tz0.read_text().strip()) / 1000
-            return f"{temp_c * 9/5 + 32:.1f}°F"
-            
+        temp_c = int(os.pread(_temp_fd["fd"], 16, 0)) / 1000
+        return f"{temp_c * 9/5 + 32:.1f}°F"
     except Exception:
         pass
     return "--"
 
-def get_camera_ping(ip):
-    """Simple ping to check connection quality."""
+def get_camera_ping(ip, port=554):
+    """Measures TCP connect time to the camera's RTSP port, in milliseconds."""
     try:
-        # Docker container needs 'iputils-ping' installed
-        res = subprocess.run(["ping", "-c", "1", "-W", "1", ip], capture_output=True, text=True)
-        if "time=" in res.stdout:
-            ms = res.stdout.split("time=")[1].split(" ")[0]
-            return float(ms)
-    except: pass
-    return None
-
-def get_recorder_status():
+        # Resolve outside the timed window so only the handshake is measured
+        family, sock_type, proto, _, addr = socket.getaddrinfo(ip, port, type=socket.SOCK_STREAM)[0]
+        with socket.socket(family, sock_type, proto) as sock:
+            sock.settimeout(1)
+            start = time.perf_counter()
+            sock.connect(addr)
+            return round((time.perf_counter() - start) * 1000, 1)
+    except OSError:
+        return None
+
+def get_recorder_status(conf):
     """Checks if new files are being written to verify recorder health."""
     try:
-        conf = Config.load()
         today_path = Config.BOX_ROOT / conf["SUBFOLDER"] / datetime.now().strftime("%Y/%m/%d")
-        if not today_path.exists():
-            return False
-        
-        files = list(today_path.glob("*.mp4"))
-        if not files:
+        entries = scan_recordings(today_path)
+        if not entries:
             return False
             
-        latest = max(files, key=lambda x: x.stat().st_mtime)
-        age = time.time() - latest.stat().st_mtime
+        age = time.time() - entries[-1][1].st_mtime
         return age < 60 # Considered active if wrote in last minute
     except:
         return False
 
-def get_cpu_usage():
-    """Reads CPU usage from /proc/stat (Linux only)."""
+def read_cpu_times():
+    """Returns cumulative (idle, total) jiffies from /proc/stat (Linux only), or None."""
     try:
-        stat_path = Path("/proc/stat")
-        if not stat_path.exists():
-            return None
-        
-        with open(stat_path) as f:
-            line = f.readline()
-        
-        parts = line.split()
-        if parts[0] != "cpu":
+        parts = read_small_file("/proc/stat", 256).split(b"\n", 1)[0].split()
+        if parts[0] != b"cpu":
             return None
         
         # user, nice, system, idle, iowait, irq, softirq, steal
         user, nice, system, idle, iowait = map(int, parts[1:6])
-        total = user + nice + system + idle + iowait
-        idle_pct = (idle + iowait) / total * 100
-        return round(100 - idle_pct, 1)
+        return idle + iowait, user + nice + system + idle + iowait
     except:
         return None
 
+def get_cpu_usage(prev, cur):
+    """CPU busy percent between two read_cpu_times() samples."""
+    if prev is None or cur is None:
+        return None
+    idle = cur[0] - prev[0]
+    total = cur[1] - prev[1]
+    if total <= 0:
+        return None
+    return round(100 - idle / total * 100, 1)
+
 def get_memory_usage():
     """Reads memory stats from /proc/meminfo (Linux only)."""
     try:
-        meminfo_path = Path("/proc/meminfo")
-        if not meminfo_path.exists():
-            return None
-        
+        # MemTotal, MemFree and MemAvailable are the first three lines, so
+        # only the head of the file is read and scanning stops once all are seen
         mem = {}
-        with open(meminfo_path) as f:
-            for line in f:
-                parts = line.split()
-                if len(parts) >= 2:
-                    key = parts[0].rstrip(':')
-                    val = int(parts[1])  # in kB
-                    mem[key] = val
+        for line in read_small_file("/proc/meminfo", 512).splitlines():
+            key, _, rest = line.partition(b":")
+            if key in (b"MemTotal", b"MemFree", b"MemAvailable"):
+                mem[key] = int(rest.split()[0])  # in kB
+                if len(mem) == 3:
+                    break
         
-        total = mem.get("MemTotal", 0)
-        available = mem.get("MemAvailable", mem.get("MemFree", 0))
+        total = mem.get(b"MemTotal", 0)
+        available = mem.get(b"MemAvailable", mem.get(b"MemFree", 0))
         used = total - available
         
         return {
@@ -242,12 +284,7 @@ def get_memory_usage():
 def get_system_uptime():
     """Reads system uptime from /proc/uptime (Linux only)."""
     try:
-        uptime_path = Path("/proc/uptime")
-        if not uptime_path.exists():
-            return None
-        
-        with open(uptime_path) as f:
-            uptime_seconds = float(f.read().split()[0])
+        uptime_seconds = float(read_small_file("/proc/uptime", 32).split()[0])
         
         days = int(uptime_seconds // 86400)
         hours = int((uptime_seconds % 86400) // 3600)
@@ -289,8 +326,76 @@ def get_network_io():
     except:
         return None
 
-def get_recording_stats(today_path, segment_time):
-    """Calculate comprehensive recording statistics for today."""
+class VitalsSampler(threading.Thread):
+    """
+    Samples the slow-moving vitals on its own schedule so /api/stats only
+    reads attributes; no probe syscalls happen on the request path.
+    """
+
+    # attribute -> refresh interval in seconds
+    INTERVALS = {
+        "recorder_active": 2, "cpu_usage": 2, "memory": 2, "uptime": 2, "network": 2,
+        "cpu_temp": 4, "box_active": 5, "ping_ms": 10, "disk": 15,
+    }
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.recorder_active = False
+        self.box_active = False
+        self.cpu_usage = None
+        self.memory = None
+        self.uptime = None
+        self.network = None
+        self.cpu_temp = "--"
+        self.ping_ms = None
+        self.disk = {"percent": 0, "free_gb": 0}
+        # Previous /proc/stat counters; usage is the delta between samples
+        self._cpu_times = None
+
+    def _sample(self, name, conf):
+        if name == "recorder_active":
+            return get_recorder_status(conf)
+        if name == "cpu_usage":
+            cpu_times = read_cpu_times()
+            usage = get_cpu_usage(self._cpu_times, cpu_times)
+            self._cpu_times = cpu_times
+            return usage
+        if name == "memory":
+            return get_memory_usage()
+        if name == "uptime":
+            return get_system_uptime()
+        if name == "network":
+            return get_network_io()
+        if name == "cpu_temp":
+            return get_cpu_temp()
+        if name == "box_active":
+            return get_box_status()
+        if name == "ping_ms":
+            return get_camera_ping(conf["CAMERA_IP"])
+        return get_disk_usage()
+
+    def run(self):
+        next_due = dict.fromkeys(self.INTERVALS, 0.0)
+        while True:
+            now = time.monotonic()
+            # One settings lookup per pass, shared by every probe that needs it
+            conf = Config.load()
+            for name, interval in self.INTERVALS.items():
+                if now >= next_due[name]:
+                    try:
+                        setattr(self, name, self._sample(name, conf))
+                    except Exception as e:
+                        logger.error(f"Error sampling {name}: {e}")
+                    next_due[name] = time.monotonic() + interval
+            time.sleep(max(0.0, min(next_due.values()) - time.monotonic()))
+
+vitals = VitalsSampler()
+
+def get_recording_stats(entries, segment_time):
+    """
+    Calculate comprehensive recording statistics for today.
+    entries are (name, stat_result) pairs, oldest first, as returned by scan_recordings.
+    """
     stats = {
         "files_today": 0,
         "total_hours": 0,
@@ -302,23 +407,19 @@ def get_recording_stats(today_path, segment_time):
     }
     
     try:
-        if not today_path.exists():
+        if not entries:
             return stats
         
-        files = sorted(today_path.glob("*.mp4"), key=lambda x: x.stat().st_mtime)
-        if not files:
-            return stats
-        
-        stats["files_today"] = len(files)
+        stats["files_today"] = len(entries)
         
         # Calculate totals
-        total_size = sum(f.stat().st_size for f in files)
+        total_size = sum(st.st_size for _, st in entries)
         stats["total_size_mb"] = round(total_size / (1024 * 1024), 1)
-        stats["avg_size_mb"] = round(stats["total_size_mb"] / len(files), 1) if files else 0
+        stats["avg_size_mb"] = round(stats["total_size_mb"] / len(entries), 1)
         
         # Estimate hours (files * segment time)
         segment_seconds = int(segment_time) if segment_time else 900
-        stats["total_hours"] = round(len(files) * segment_seconds / 3600, 1)
+        stats["total_hours"] = round(len(entries) * segment_seconds / 3600, 1)
         
         # Estimate bitrate from average file size and segment duration
         if stats["avg_size_mb"] > 0 and segment_seconds > 0:
@@ -326,37 +427,27 @@ def get_recording_stats(today_path, segment_time):
             avg_bytes = stats["avg_size_mb"] * 1024 * 1024
             stats["est_bitrate_mbps"] = round(avg_bytes * 8 / segment_seconds / 1_000_000, 1)
         
-        # Recent files (last 8)
-        recent = files[-8:] if len(files) >= 8 else files
-        recent.reverse()  # Most recent first
-        for f in recent:
-            try:
-                stats["recent_files"].append({
-                    "name": f.name,
-                    "size_mb": round(f.stat().st_size / (1024 * 1024), 1),
-                    "time": datetime.fromtimestamp(f.stat().st_mtime).strftime("%I:%M %p")
-                })
-            except:
-                continue
+        # Recent files (last 8), most recent first
+        for name, st in reversed(entries[-8:]):
+            stats["recent_files"].append({
+                "name": name,
+                "size_mb": round(st.st_size / (1024 * 1024), 1),
+                "time": datetime.fromtimestamp(st.st_mtime).strftime("%I:%M %p")
+            })
         
-        # Detect gaps (>2x segment time between files)
+        # Detect gaps (>2x segment time between files), in one vectorized pass
         threshold = segment_seconds * 2
-        for i in range(1, len(files)):
-            try:
-                prev_mtime = files[i-1].stat().st_mtime
-                curr_mtime = files[i].stat().st_mtime
-                gap = curr_mtime - prev_mtime - segment_seconds
-                
-                if gap > threshold:
-                    gap_start = datetime.fromtimestamp(prev_mtime + segment_seconds)
-                    gap_end = datetime.fromtimestamp(curr_mtime)
-                    stats["gaps"].append({
-                        "start": gap_start.strftime("%I:%M %p"),
-                        "end": gap_end.strftime("%I:%M %p"),
-                        "duration_min": round(gap / 60)
-                    })
-            except:
-                continue
+        mtimes = np.fromiter((st.st_mtime for _, st in entries), dtype=np.float64, count=len(entries))
+        gaps = np.diff(mtimes) - segment_seconds
+        for i in np.flatnonzero(gaps > threshold).tolist():
+            prev_mtime = mtimes[i].item()
+            gap_start = datetime.fromtimestamp(prev_mtime + segment_seconds)
+            gap_end = datetime.fromtimestamp(mtimes[i + 1].item())
+            stats["gaps"].append({
+                "start": gap_start.strftime("%I:%M %p"),
+                "end": gap_end.strftime("%I:%M %p"),
+                "duration_min": round(gaps[i].item() / 60)
+            })
         
     except Exception as e:
         logger.error(f"Error calculating recording stats: {e}")
@@ -364,31 +455,29 @@ def get_recording_stats(today_path, segment_time):
     return stats
 
 
-def get_storage_trend():
+def get_storage_trend(conf):
     """Get storage usage for the last 7 days."""
     trend = []
     try:
-        conf = Config.load()
         base_path = Config.BOX_ROOT / conf["SUBFOLDER"]
+        segment_time = int(conf.get("SEGMENT_TIME", 900))
+        now = datetime.now()
         
         for i in range(7):
-            day = datetime.now() - timedelta(days=i)
+            day = now - timedelta(days=i)
             day_path = base_path / day.strftime("%Y/%m/%d")
             
-            if day_path.exists():
-                files = list(day_path.glob("*.mp4"))
-                total_mb = sum(f.stat().st_size for f in files) / (1024 * 1024)
-                hours = len(files) * int(conf.get("SEGMENT_TIME", 900)) / 3600
-            else:
-                total_mb = 0
-                hours = 0
+            # Past days never change, so these are served from the scan cache
+            entries = scan_recordings(day_path)
+            total_mb = sum(st.st_size for _, st in entries) / (1024 * 1024)
+            hours = len(entries) * segment_time / 3600
             
             trend.append({
                 "date": day.strftime("%m/%d"),
                 "day": day.strftime("%a"),
                 "size_gb": round(total_mb / 1024, 2),
                 "hours": round(hours, 1),
-                "files": len(files) if day_path.exists() else 0
+                "files": len(entries)
             })
         
     except Exception as e:
@@ -396,35 +485,118 @@ def get_storage_trend():
     
     return trend
 
-# --- Routes ---
+# --- Directory Scan Cache ---
 
-@app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request, "page": "dashboard"})
+# Force a full rescan at least this often, in case the mount doesn't bump
+# directory mtimes reliably
+DIR_CACHE_MAX_AGE = 60
+# Day directories kept indexed: today, the 7-day trend and a few library pages
+DIR_CACHE_MAX_DAYS = 16
+# Keyed by directory path: {"mtime", "ts", "entries", "thumbs"}. Shared by
+# the vitals thread and to_thread workers; the lock covers insert/evict
+_dir_cache = {}
+_dir_cache_lock = threading.Lock()
 
-@app.get("/api/stats")
-async def api_stats():
-    # 1. System Vitals
-    conf = Config.load()
-    cam_active = get_recorder_status()
-    box_active = Config.BOX_ROOT.exists() and os.access(Config.BOX_ROOT, os.R_OK)
-    disk = get_disk_usage()
-    cpu_temp = get_cpu_temp()
-    ping_ms = get_camera_ping(conf["CAMERA_IP"])
-    
-    # New system metrics
-    cpu_usage = get_cpu_usage()
-    memory = get_memory_usage()
-    uptime = get_system_uptime()
-    network = get_network_io()
-    
-    # 2. File & Timeline Logic
-    today_path = Config.BOX_ROOT / conf["SUBFOLDER"] / datetime.now().strftime("%Y/%m/%d")
+def scan_day(day_path):
+    """
+    Returns (entries, thumbs) for day_path: (name, stat_result) for every .mp4,
+    oldest first, and the set of .thumb.jpg names next to them.
+    The listing is reused while the directory mtime is unchanged; only the
+    newest file (the one still being written) is re-stat'ed.
+    """
+    path = str(day_path)
+    try:
+        dir_mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        with _dir_cache_lock:
+            _dir_cache.pop(path, None)
+        return [], frozenset()
+
+    now = time.monotonic()
+    cache = _dir_cache.get(path)
+    if (cache is not None and cache["entries"] and cache["mtime"] == dir_mtime
+            and now - cache["ts"] < DIR_CACHE_MAX_AGE):
+        name, _ = cache["entries"][-1]
+        try:
+            cache["entries"] = cache["entries"][:-1] + [(name, os.stat(os.path.join(path, name)))]
+            return list(cache["entries"]), cache["thumbs"]
+        except FileNotFoundError:
+            pass # Deleted underneath us; fall through to a full rescan
+
+    entries = []
+    thumbs = set()
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                if e.name.endswith(".mp4"):
+                    try:
+                        entries.append((e.name, e.stat()))
+                    except FileNotFoundError:
+                        continue # Deleted mid-listing
+                elif e.name.endswith(".thumb.jpg"):
+                    thumbs.add(e.name)
+    except FileNotFoundError:
+        return [], frozenset()
+    entries.sort(key=lambda e: e[1].st_mtime)
+    thumbs = frozenset(thumbs)
+
+    with _dir_cache_lock:
+        _dir_cache.pop(path, None)
+        if len(_dir_cache) >= DIR_CACHE_MAX_DAYS:
+            # Dicts keep insertion order, and a rescan re-inserts, so the first key is the stalest
+            del _dir_cache[next(iter(_dir_cache))]
+        _dir_cache[path] = {"mtime": dir_mtime, "ts": now, "entries": entries, "thumbs": thumbs}
+    return list(entries), thumbs
+
+def scan_recordings(day_path):
+    """Lists (name, stat_result) for every .mp4 in day_path, oldest first."""
+    return scan_day(day_path)[0]
+
+def parse_segment_time(name):
+    """Returns the time of day encoded in a segment filename (PM-01-18-00.mp4), or None."""
+    seconds = parse_segment_seconds(name)
+    if seconds is None:
+        return None
+    return dt_time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+# A day's segment names recur on every dashboard refresh, so parse each once
+@functools.lru_cache(maxsize=4096)
+def segment_start_ts(name, day):
+    """Returns the start timestamp encoded in a segment filename (PM-01-18-00.mp4), or NaN."""
+    file_time = parse_segment_time(name)
+    if file_time is None:
+        return float("nan")
+    return datetime.combine(day, file_time).timestamp()
+
+def get_box_status():
+    """Checks that the Box mount is present and readable."""
+    return Config.BOX_ROOT.exists() and os.access(Config.BOX_ROOT, os.R_OK)
+
+# The dashboard counts as watched for this long after the page is loaded or
+# polled from a visible tab
+DASHBOARD_WATCH_SECONDS = 60
+# How stale the heavy dashboard sections may get while nobody is watching
+IDLE_DETAIL_SECONDS = 30
+_last_dashboard_hit = {"ts": float("-inf")}
+_detail_cache = {"path": None, "ts": 0.0, "recording": None, "storage_trend": None, "timeline": None}
+
+def mark_dashboard_watched():
+    _last_dashboard_hit["ts"] = time.monotonic()
+
+def dashboard_watched():
+    return time.monotonic() - _last_dashboard_hit["ts"] < DASHBOARD_WATCH_SECONDS
+
+def compute_file_stats(conf):
+    """File & timeline section of the dashboard. Blocking; walks today's recordings."""
+    now = datetime.now()
+    today_path = Config.BOX_ROOT / conf["SUBFOLDER"] / now.strftime("%Y/%m/%d")
     current_file = "Waiting..."
     current_size = "0.00 MB"
     status_msg = "Idle"
     files_today = 0
-    timeline_segments = []
+    # Percent-of-day offsets and widths, one entry per segment; sent as two
+    # numeric arrays (orjson encodes NumPy directly) and styled in the browser
+    timeline_segments = {"left": [], "width": []}
     elapsed_seconds = 0
     
     # Parse segment time with error handling
@@ -436,68 +608,97 @@ async def api_stats():
     
     logger.info(f"Segment limit seconds: {segment_limit_seconds}")
     
-    # Get comprehensive recording stats
-    recording_stats = get_recording_stats(today_path, segment_limit_seconds)
-    
-    # Get 7-day storage trend
-    storage_trend = get_storage_trend()
+    # One stat per file, shared by the recording stats and the timeline below
+    entries = scan_recordings(today_path)
+
+    # Recording stats, the 7-day trend and the timeline are the heavy part;
+    # with no dashboard in view they are reused for up to IDLE_DETAIL_SECONDS
+    detail = _detail_cache
+    reuse_detail = (not dashboard_watched() and detail["path"] == today_path
+                    and time.monotonic() - detail["ts"] < IDLE_DETAIL_SECONDS)
+    if reuse_detail:
+        recording_stats = detail["recording"]
+        storage_trend = detail["storage_trend"]
+        timeline_segments = detail["timeline"]
+    else:
+        # Get comprehensive recording stats
+        recording_stats = get_recording_stats(entries, segment_limit_seconds)
+
+        # Get 7-day storage trend
+        storage_trend = get_storage_trend(conf)
     
-    if today_path.exists():
-        files = list(today_path.glob("*.mp4"))
-        files_today = len(files)
-        if files:
-            files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-            latest = files[0]
-            age = time.time() - latest.stat().st_mtime
-            current_file = latest.name
-            current_size = f"{(latest.stat().st_size / (1024*1024)):.2f} MB"
-            status_msg = "Recording (Active)" if age < 20 else f"Last write: {int(age)}s ago"
-            
-            # Calculate elapsed time from filename if active
-            if age < 20:
-                try:
-                    # Filename format: PM-01-18-00.mp4
-                    # We need to combine with today's date to get full timestamp
-                    time_str = latest.stem # PM-01-18-00
-                    # Parse: %p-%I-%M-%S
-                    file_time = datetime.strptime(time_str, "%p-%I-%M-%S").time()
-                    file_dt = datetime.combine(datetime.now().date(), file_time)
-                    elapsed_seconds = int((datetime.now() - file_dt).total_seconds())
-                except ValueError:
-                    pass # Fallback to 0 if format doesn't match
-
-            # Build Timeline Data
-            start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
-            
-            for f in files:
-                try:
-                    # Parse start time from filename to get actual duration
-                    # Format: PM-01-18-00
-                    file_time = datetime.strptime(f.stem, "%p-%I-%M-%S").time()
-                    start_dt = datetime.combine(datetime.now().date(), file_time)
-                    start_ts = start_dt.timestamp()
-                    
-                    end_ts = f.stat().st_mtime
-                    duration = end_ts - start_ts
-                    
-                    # Sanity check for negative or zero duration
-                    if duration <= 0:
-                        duration = segment_limit_seconds
-                        start_ts = end_ts - duration
-                        
-                except ValueError:
-                    # Fallback if filename parsing fails
-                    end_ts = f.stat().st_mtime
-                    duration = segment_limit_seconds
-                    if f == latest and age < 20:
-                        # Use creation time for active file if parsing fails
-                        # Note: st_ctime is change time on Linux, but best backward-compatible guess
-                        duration = end_ts - f.stat().st_ctime
-                    start_ts = end_ts - duration
-
-                left_pct = max(0, ((start_ts - start_of_day) / 86400) * 100)
-                width_pct = (duration / 86400) * 100
-                timeline_segments.append({"left": f"{left_pct:.2f}%", "width": f"{width_pct:.2f}%"})
+    files_today = len(entries)
+    if entries:
+        # Entries are oldest first, so the newest segment is last
+        latest_name, latest_st = entries[-1]
+        age = time.time() - latest_st.st_mtime
+        current_file = latest_name
+        current_size = f"{(latest_st.st_size / (1024*1024)):.2f} MB"
+        status_msg = "Recording (Active)" if age < 20 else f"Last write: {int(age)}s ago"
+        
+        # Calculate elapsed time from filename if active
+        if age < 20:
+            # Filename format: PM-01-18-00.mp4
+            # We need to combine with today's date to get full timestamp
+            file_time = parse_segment_time(latest_name)
+            if file_time is not None: # Fallback to 0 if format doesn't match
+                file_dt = datetime.combine(now.date(), file_time)
+                elapsed_seconds = int((now - file_dt).total_seconds())
+
+    if entries and not reuse_detail:
+        # Build Timeline Data (vectorized; a day can hold hundreds of segments)
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        today = now.date()
+        count = len(entries)
+        ends = np.fromiter((st.st_mtime for _, st in entries), dtype=np.float64, count=count)
+        starts = np.fromiter((segment_start_ts(name, today) for name, _ in entries), dtype=np.float64, count=count)
+        durations = ends - starts
+
+        # Unparsable names (NaN) and negative/zero durations fall back to the segment length
+        durations[~(durations > 0)] = segment_limit_seconds
+        if age < 20 and np.isnan(starts[-1]):
+            # Use creation time for active file if parsing fails
+            # Note: st_ctime is change time on Linux, but best backward-compatible guess
+            durations[-1] = ends[-1] - latest_st.st_ctime
+        starts = ends - durations
+
+        lefts = np.maximum(0, (starts - start_of_day) / 86400 * 100)
+        widths = durations / 86400 * 100
+        timeline_segments = {"left": lefts.round(2), "width": widths.round(2)}
+
+    if not reuse_detail:
+        detail.update(path=today_path, ts=time.monotonic(), recording=recording_stats,
+                      storage_trend=storage_trend, timeline=timeline_segments)
+
+    return {
+        "current_file": current_file,
+        "current_size": current_size,
+        "status_msg": status_msg,
+        "files_today": files_today,
+        "timeline": timeline_segments,
+        "elapsed_seconds": elapsed_seconds,
+        "segment_limit_seconds": segment_limit_seconds,
+        "recording": recording_stats,
+        "storage_trend": storage_trend,
+    }
+
+async def collect_stats():
+    """Gathers everything the dashboard shows; only the file stats are computed per call."""
+    conf = Config.load()
+    # 1. System Vitals (sampled in the background)
+    cam_active = vitals.recorder_active
+    box_active = vitals.box_active
+    disk = vitals.disk
+    cpu_temp = vitals.cpu_temp
+    ping_ms = vitals.ping_ms
+    # New system metrics
+    cpu_usage = vitals.cpu_usage
+    memory = vitals.memory
+    uptime = vitals.uptime
+    network = vitals.network
+    # 2. File & Timeline Logic (directory scans stay off the event loop)
+    files = await asyncio.to_thread(compute_file_stats, conf)
+    recording_stats = files["recording"]
 
     # Build alerts list
     alerts = []
@@ -512,20 +713,20 @@ async def api_stats():
     for gap in recording_stats.get("gaps", [])[-3:]:  # Last 3 gaps only
         alerts.append({"type": "info", "msg": f"Gap: {gap['start']} - {gap['end']} ({gap['duration_min']}min)"})
 
-    return JSONResponse({
+    return {
         # Original fields
         "cam_active": cam_active, 
         "box_active": box_active,
-        "current_file": current_file, 
-        "current_size": current_size, 
-        "status_msg": status_msg,
+        "current_file": files["current_file"], 
+        "current_size": files["current_size"], 
+        "status_msg": files["status_msg"],
         "disk": disk, 
-        "files_today": files_today,
+        "files_today": files["files_today"],
         "cpu_temp": cpu_temp, 
         "ping_ms": ping_ms, 
-        "timeline": timeline_segments,
-        "elapsed_seconds": elapsed_seconds, 
-        "segment_limit_seconds": segment_limit_seconds,
+        "timeline": files["timeline"],
+        "elapsed_seconds": files["elapsed_seconds"], 
+        "segment_limit_seconds": files["segment_limit_seconds"],
         
         # New system metrics
         "cpu_usage": cpu_usage,
@@ -537,11 +738,99 @@ async def api_stats():
         "recording": recording_stats,
         
         # 7-day trend
-        "storage_trend": storage_trend,
+        "storage_trend": files["storage_trend"],
         
         # Alerts
         "alerts": alerts
-    })
+    }
+
+STATS_TTL_SECONDS = 2.0
+_stats_cache = {"ts": 0.0, "data": None, "body": b"", "etag": ""}
+_stats_lock = asyncio.Lock()
+
+# --- Routes ---
+
+@app.on_event("startup")
+async def prerender_pages():
+    get_dashboard_page()
+
+@app.on_event("startup")
+async def start_vitals_sampler():
+    vitals.start()
+
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    mark_dashboard_watched()
+    html, etag = get_dashboard_page()
+    headers = {"Cache-Control": "no-cache", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(html, headers=headers)
+
+@app.get("/api/stats")
+async def api_stats(request: Request, force: bool = False, watching: bool = False):
+    if watching:
+        mark_dashboard_watched()
+    # Every open dashboard polls this, so share one computation per TTL window
+    def fresh():
+        return (_stats_cache["data"] is not None
+                and time.monotonic() - _stats_cache["ts"] < STATS_TTL_SECONDS)
+
+    if force or not fresh():
+        async with _stats_lock:
+            # Another request may have refreshed the cache while we waited
+            if force or not fresh():
+                data = await collect_stats()
+                # Serialize and tag once per refresh; cache hits just resend the bytes
+                body = render_json(data)
+                _stats_cache["body"] = body
+                _stats_cache["etag"] = f'"{hashlib.blake2s(body, digest_size=8).hexdigest()}"'
+                _stats_cache["data"] = data
+                _stats_cache["ts"] = time.monotonic()
+
+    # Pollers revalidate with If-None-Match; an unchanged payload costs a bodiless 304
+    headers = {"Cache-Control": "no-cache", "ETag": _stats_cache["etag"]}
+    if request.headers.get("if-none-match") == _stats_cache["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(_stats_cache["body"], media_type="application/json", headers=headers)
+
+def list_library_videos(target_dir):
+    """Builds the library entries for one day's directory. Blocking."""
+    videos = []
+    # Shares the per-day scan cache with the dashboard stats; thumbnail
+    # existence comes from the same listing instead of a stat per video
+    entries, thumbs = scan_day(target_dir)
+    recordings = sorted((name, st.st_size) for name, st in entries)
+
+    # Create relative paths for the player
+    rel_dir = target_dir.relative_to(Config.BOX_ROOT)
+    for name, size in recordings:
+        rel_path = rel_dir / name
+        thumb_rel = rel_path.with_suffix('.thumb.jpg')
+        videos.append({
+            "name": name, 
+            "size": f"{round(size/(1024*1024),1)} MB", 
+            "path": str(rel_path),
+            "thumb": str(thumb_rel) if thumb_rel.name in thumbs else None
+        })
+    return videos
+
+def list_timelapses(output_dir):
+    """Builds the timelapse entries, newest first. Blocking."""
+    videos = []
+    # One cached scandir pass; sizes come from the entries' stat results
+    entries, _ = scan_day(output_dir)
+    rel_dir = output_dir.relative_to(Config.BOX_ROOT)
+    for name, st in sorted(entries, key=lambda e: e[0], reverse=True): # Newest first
+        # Timelapses don't have thumbnails generated yet, but we could add that later.
+        # For now, we'll just show the video link.
+        videos.append({
+            "name": name, 
+            "size": f"{round(st.st_size/(1024*1024),1)} MB", 
+            "path": str(rel_dir / name),
+            "thumb": None # Placeholder
+        })
+    return videos
 
 @app.get("/library", response_class=HTMLResponse)
 async def library(request: Request, date: str = None):
@@ -558,31 +847,19 @@ async def library(request: Request, date: str = None):
     
     # Additional safety check: ensure resolved path is within expected base
     try:
-        resolved = target_dir.resolve()
-        expected_base = (Config.BOX_ROOT / conf["SUBFOLDER"]).resolve()
-        if not str(resolved).startswith(str(expected_base)):
+        # Both resolves walk the Box mount, so both run off the event loop
+        base_dir = Config.BOX_ROOT / conf["SUBFOLDER"]
+        resolved, expected_base = await asyncio.to_thread(
+            lambda: (target_dir.resolve(), base_dir.resolve()))
+        if not resolved.is_relative_to(expected_base):
             return HTMLResponse("Access Denied", 403)
     except Exception:
         return HTMLResponse("Invalid path", 400)
     
-    videos = []
-    if target_dir.exists():
-        for f in sorted(target_dir.glob("*.mp4")):
-            # Create a relative path for the player
-            try:
-                rel_path = f.relative_to(Config.BOX_ROOT)
-                thumb_path = f.with_suffix('.thumb.jpg')
-                thumb_rel = thumb_path.relative_to(Config.BOX_ROOT) if thumb_path.exists() else None
-                
-                videos.append({
-                    "name": f.name, 
-                    "size": f"{round(f.stat().st_size/(1024*1024),1)} MB", 
-                    "path": str(rel_path),
-                    "thumb": str(thumb_rel) if thumb_rel else None
-                })
-            except ValueError:
-                pass # Should not happen if BOX_ROOT is correct
-    return templates.TemplateResponse("index.html", {"request": request, "page": "library", "current_date": date, "videos": videos})
+    # The listing hits the Box mount, so keep it off the event loop
+    videos = await asyncio.to_thread(list_library_videos, target_dir)
+    return render_listing(request, page_etag("library", date, videos),
+                          {"page": "library", "current_date": date, "videos": videos})
 
 @app.get("/settings", response_class=HTMLResponse)
 async def settings(request: Request):
@@ -598,7 +875,7 @@ async def settings(request: Request):
         "config": conf,
         "segment_minutes": minutes,
         "segment_seconds": seconds,
-        "version": get_version()
+        "version": VERSION
     })
 
 @app.post("/settings")
@@ -637,19 +914,20 @@ async def save_settings(request: Request,
         "message": msg,
         "segment_minutes": segment_minutes,
         "segment_seconds": segment_seconds,
-        "version": get_version()
+        "version": VERSION
     })
 
 @app.get("/video_feed")
 async def video_feed():
-    def gen():
+    async def gen():
+        # One capture/encode is shared by every viewer; each just waits for the next frame
         while True:
-            frame = camera.get_frame()
+            frame = await camera.next_frame()
             if frame:
-                yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                time.sleep(0.06) # ~15 FPS
-            else:
-                time.sleep(0.1) # Wait for frame
+                # Sent as separate chunks so the JPEG is never copied into a new buffer
+                yield MJPEG_PART_HEADER
+                yield frame
+                yield MJPEG_PART_TRAILER
                 
     return StreamingResponse(gen(), media_type="multipart/x-mixed-replace; boundary=frame")
 
@@ -664,6 +942,11 @@ async def audio_feed():
         "-nostdin",
         "-rtsp_transport", "tcp",
         "-timeout", "5000000",
+        # Start playing sooner: no input buffering, and the SDP already
+        # describes the streams, so a short probe is enough
+        "-fflags", "nobuffer",
+        "-flags", "low_delay",
+        "-analyzeduration", "100000",
         "-i", url,
         "-vn",              # weirdly enough, we want no video
         "-f", "mp3",        # format mp3
@@ -671,132 +954,150 @@ async def audio_feed():
         "-ab", "128k",      # bitrate
         "-ac", "2",         # channels
         "-ar", "44100",     # sample rate
+        "-flush_packets", "1", # write each MP3 frame out as soon as it is encoded
         "-"                 # output to pipe
     ]
     
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    # asyncio subprocess so reads wait on the event loop instead of tying up a worker thread
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
 
-    def generate_audio():
+    async def generate_audio():
         try:
             while True:
-                data = process.stdout.read(4096)
+                data = await process.stdout.read(65536)
                 if not data:
                     break
                 yield data
         finally:
-            process.terminate()
-            try:
-                process.wait(timeout=2)
-            except:
-                process.kill()
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    process.kill()
 
     return StreamingResponse(generate_audio(), media_type="audio/mpeg")
 
 @app.get("/play_file/{file_path:path}")
-async def play_file(file_path: str):
+async def play_file(request: Request, file_path: str):
     # Securely serve files from BOX_ROOT
-    safe_path = (Config.BOX_ROOT / file_path).resolve()
-    if not str(safe_path).startswith(str(Config.BOX_ROOT.resolve())):
+    try:
+        safe_path = await asyncio.to_thread(resolve_box_path, file_path)
+    except OSError:
+        return HTMLResponse("File not found", 404)
+    if safe_path is None:
         return HTMLResponse("Access Denied", 403)
-    if not safe_path.exists():
+    if XACCEL_PREFIX:
+        # nginx streams the file itself (sendfile); Python only sends headers
+        rel_path = safe_path.relative_to(BOX_ROOT_RESOLVED).as_posix()
+        return Response(headers={"X-Accel-Redirect": f"{XACCEL_PREFIX}/{quote(rel_path)}"},
+                        media_type="video/mp4")
+    try:
+        stat_result = await asyncio.to_thread(safe_path.stat)
+    except OSError:
+        # Deleted since it was resolved and cached
+        resolve_box_path.cache_clear()
         return HTMLResponse("File not found", 404)
-    return FileResponse(safe_path, media_type="video/mp4")
+    # Always revalidated: the segment being recorded grows, and a forced
+    # timelapse regeneration rewrites the same file. The ETag tracks mtime and
+    # size, so an unchanged file costs a bodiless 304, and Range requests
+    # (If-Range) never splice bytes of an old copy with a new one
+    response = FileResponse(safe_path, stat_result=stat_result, media_type="video/mp4",
+                            headers={"Cache-Control": "no-cache"})
+    if request.headers.get("if-none-match") == response.headers["etag"]:
+        return Response(status_code=304, headers={"Cache-Control": "no-cache",
+                                                  "ETag": response.headers["etag"]})
+    return response
 
-@app.get("/thumb/{file_path:path}")
-async def serve_thumbnail(file_path: str):
-    """Securely serve thumbnail images from BOX_ROOT."""
-    safe_path = (Config.BOX_ROOT / file_path).resolve()
-    if not str(safe_path).startswith(str(Config.BOX_ROOT.resolve())):
-        return HTMLResponse("Access Denied", 403)
-    if not safe_path.exists():
-        return HTMLResponse("Thumbnail not found", 404)
-    return FileResponse(safe_path, media_type="image/jpeg")
+# Thumbnails are plain files under BOX_ROOT; StaticFiles serves them without
+# a route handler, answers ETag/Last-Modified revalidations with 304, and
+# refuses paths (including symlinks) that resolve outside the directory. check_dir=False because the
+# Box mount may not be up yet when the app starts.
+app.mount("/thumb", StaticFiles(directory=str(Config.BOX_ROOT), check_dir=False), name="thumb")
 
 @app.get("/timelapses", response_class=HTMLResponse)
 async def timelapses(request: Request):
     conf = Config.load()
     output_dir = Config.BOX_ROOT / conf["SUBFOLDER"] / conf["TIMELAPSE_OUTPUT_DIR"]
-    
-    videos = []
-    if output_dir.exists():
-        for f in sorted(output_dir.glob("*.mp4"), reverse=True): # Newest first
-            try:
-                rel_path = f.relative_to(Config.BOX_ROOT)
-                # Timelapses don't have thumbnails generated yet, but we could add that later.
-                # For now, we'll just show the video link.
-                
-                videos.append({
-                    "name": f.name, 
-                    "size": f"{round(f.stat().st_size/(1024*1024),1)} MB", 
-                    "path": str(rel_path),
-                    "thumb": None # Placeholder
-                })
-            except ValueError:
-                pass
+    videos = await asyncio.to_thread(list_timelapses, output_dir)
+    today = datetime.now().strftime("%Y-%m-%d")
 
-    return templates.TemplateResponse("index.html", {
-        "request": request, 
+    return render_listing(request, page_etag("timelapses", today, videos), {
         "page": "timelapses", 
         "videos": videos,
-        "today": datetime.now().strftime("%Y-%m-%d"),
+        "today": today,
         "speed_max": MAX_SPEED_MULTIPLIER
     })
 
+# Timelapse jobs hold a thread for as long as ffmpeg runs (minutes), so they
+# get their own single worker instead of a slot in the shared request
+# threadpool; queued jobs run one at a time rather than fighting for the CPU
+_timelapse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="timelapse")
+
+def submit_timelapse_job(func, **kwargs):
+    """Queues a timelapse job on the dedicated worker without waiting for it."""
+    future = asyncio.get_running_loop().run_in_executor(
+        _timelapse_executor, functools.partial(func, **kwargs))
+
+    def log_result(fut):
+        if not fut.cancelled() and fut.exception() is not None:
+            logger.error(f"Timelapse job failed: {fut.exception()}")
+    future.add_done_callback(log_result)
+
 @app.post("/api/generate_timelapse")
 async def api_generate_timelapse(
-    background_tasks: BackgroundTasks,
     date: str = Form(...),
     force: bool = Form(False),
     speed_multiplier: int = Form(None),
 ):
     # Validate date
     if not validate_date_param(date):
-        return JSONResponse({"success": False, "message": "Invalid date format"}, status_code=400)
+        return ORJSONResponse({"success": False, "message": "Invalid date format"}, status_code=400)
     
     target_date = datetime.strptime(date, "%Y-%m-%d").date()
     
     # Prevent future dates
     if target_date >= datetime.now().date():
-        return JSONResponse({"success": False, "message": "Cannot generate timelapse for today or future dates."}, status_code=400)
+        return ORJSONResponse({"success": False, "message": "Cannot generate timelapse for today or future dates."}, status_code=400)
 
-    # Add to background tasks
-    background_tasks.add_task(
+    submit_timelapse_job(
         generate_timelapse,
         target_date=target_date,
         force=force,
         speed_multiplier=speed_multiplier,
     )
     
-    return JSONResponse({"success": True, "message": f"Timelapse generation started for {date}. Check back in a few minutes."})
+    return ORJSONResponse({"success": True, "message": f"Timelapse generation started for {date}. Check back in a few minutes."})
 
 
 @app.post("/api/generate_timelapse_range")
 async def api_generate_timelapse_range(
-    background_tasks: BackgroundTasks,
     start_date: str = Form(...),
     end_date: str = Form(...),
     force: bool = Form(False),
     speed_multiplier: int = Form(None),
 ):
     if not validate_date_param(start_date) or not validate_date_param(end_date):
-        return JSONResponse({"success": False, "message": "Invalid date format"}, status_code=400)
+        return ORJSONResponse({"success": False, "message": "Invalid date format"}, status_code=400)
 
     start_dt = datetime.strptime(start_date, "%Y-%m-%d").date()
     end_dt = datetime.strptime(end_date, "%Y-%m-%d").date()
 
     if start_dt >= datetime.now().date() or end_dt >= datetime.now().date():
-        return JSONResponse(
+        return ORJSONResponse(
             {"success": False, "message": "Cannot generate timelapse for today or future dates."},
             status_code=400,
         )
 
     if start_dt > end_dt:
-        return JSONResponse(
+        return ORJSONResponse(
             {"success": False, "message": "Start date must be before end date."},
             status_code=400,
         )
 
-    background_tasks.add_task(
+    submit_timelapse_job(
         generate_timelapse_range,
         start_date=start_dt,
         end_date=end_dt,
@@ -804,7 +1105,7 @@ async def api_generate_timelapse_range(
         speed_multiplier=speed_multiplier,
     )
 
-    return JSONResponse({
+    return ORJSONResponse({
         "success": True,
         "message": f"Range timelapse generation started for {start_date} to {end_date}. Check back soon."
     })
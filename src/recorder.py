@@ -2,17 +2,19 @@ import time
 import subprocess
 import sys
 import os
+import select
 import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from config import Config
+from config import Config, parse_segment_seconds
 
 def wait_for_box():
     """Waits for the Box mount to be available and writable."""
     print("Waiting for Box mount at /data/box...")
     max_attempts = 60
     for i in range(max_attempts):
-        if Config.BOX_ROOT.exists() and os.access(Config.BOX_ROOT, os.W_OK):
+        # access() is False for a missing path too, so one call covers both checks
+        if os.access(Config.BOX_ROOT, os.W_OK):
             print("Box mount is ready!")
             return True
         print(f"Waiting... ({i+1}/{max_attempts})")
@@ -27,6 +29,16 @@ def ensure_directories():
     today_path.mkdir(parents=True, exist_ok=True)
     return today_path, conf
 
+# Library cards are at least 280px wide and 160px tall
+THUMB_WIDTH = 480
+
+# Thumbnails only need the first video frame: probe just the head of the
+# file, leave audio, subtitle and data streams undecoded, and encode a
+# card-sized JPEG instead of the full camera resolution
+THUMB_INPUT_ARGS = ['-probesize', '200k']
+THUMB_OUTPUT_ARGS = ['-an', '-sn', '-dn', '-vf', f'scale={THUMB_WIDTH}:-2',
+                     '-frames:v', '1', '-q:v', '2']
+
 def generate_thumbnail(video_path: Path) -> bool:
     """
     Generates thumbnail from first frame of video.
@@ -43,9 +55,10 @@ def generate_thumbnail(video_path: Path) -> bool:
         # Run ffmpeg to extract one frame
         subprocess.run([
             'ffmpeg', '-nostdin',
+            *THUMB_INPUT_ARGS,
             '-i', str(video_path),
-            '-vframes', '1',
-            '-q:v', '2',
+            '-map', '0:v:0',
+            *THUMB_OUTPUT_ARGS,
             '-y',
             str(thumb_path)
         ], capture_output=True, check=True, timeout=15)
@@ -59,13 +72,48 @@ def generate_thumbnail(video_path: Path) -> bool:
         print(f"Failed to generate thumbnail for {video_path.name}: {e}")
         return False
 
+# Videos handed to one ffmpeg process when catching up on a backlog
+THUMB_BATCH_SIZE = 8
+
+def generate_thumbnails(videos: list) -> set:
+    """
+    Generates thumbnails for several videos with a single ffmpeg process,
+    paying its startup once instead of per video.
+    Returns the set of videos that now have a thumbnail.
+    """
+    if len(videos) == 1:
+        return set(videos) if generate_thumbnail(videos[0]) else set()
+
+    cmd = ['ffmpeg', '-nostdin', '-y']
+    for video in videos:
+        cmd += [*THUMB_INPUT_ARGS, '-i', str(video)]
+    for i, video in enumerate(videos):
+        cmd += ['-map', f'{i}:v:0', *THUMB_OUTPUT_ARGS, str(video.with_suffix('.thumb.jpg'))]
+
+    try:
+        subprocess.run(cmd, capture_output=True, check=True, timeout=15 * len(videos))
+        for video in videos:
+            print(f"Generated thumbnail: {video.with_suffix('.thumb.jpg').name}")
+        return set(videos)
+    except Exception as e:
+        # One unreadable video fails the whole batch; retry them one by one
+        print(f"Batched thumbnail generation failed ({e}); retrying individually")
+        return {video for video in videos if generate_thumbnail(video)}
+
+# The mount doesn't always bump directory mtimes, so relist at least this often
+THUMB_LISTING_MAX_AGE = 60
+
 def thumbnail_watcher():
     """
     Background thread to watch for new videos and generate thumbnails.
     Fixes previous race condition by ensuring files are stable before processing.
     """
     seen_files = set()
+    # Videos from the last listing still without a thumbnail (being written, or failed)
+    waiting = []
     current_day = None
+    listed_mtime = None
+    listed_at = 0.0
     
     print("Thumbnail watcher started.")
     
@@ -77,32 +125,66 @@ def thumbnail_watcher():
             
             if today != current_day:
                 seen_files.clear()
+                waiting = []
+                listed_mtime = None
                 current_day = today
             
-            if today_path.exists():
-                # List all mp4 files
-                files = list(today_path.glob("*.mp4"))
+            try:
+                dir_mtime = os.stat(today_path).st_mtime_ns
+            except FileNotFoundError:
+                dir_mtime = None
+            
+            # Only relist when files were added or removed; otherwise just
+            # recheck the few videos still waiting for a thumbnail
+            if dir_mtime is not None and (dir_mtime != listed_mtime
+                                          or time.monotonic() - listed_at > THUMB_LISTING_MAX_AGE):
+                # One listing gives both the videos and the thumbnails already made
+                with os.scandir(today_path) as it:
+                    entries = [e for e in it if e.name.endswith((".mp4", ".thumb.jpg"))]
+                thumbs = {e.name for e in entries if e.name.endswith(".thumb.jpg")}
                 
-                for video in files:
+                waiting = []
+                for entry in entries:
+                    if not entry.name.endswith(".mp4"):
+                        continue
+                    video = Path(entry.path)
                     # Skip if we've already successfully processed this file
                     if video in seen_files:
                         continue
-
-                    # STABILITY CHECK:
-                    # Skip files modified in the last 15 seconds.
-                    # This ensures we don't try to read a file currently being written by the recorder.
-                    try:
-                        last_modified = video.stat().st_mtime
-                        if (time.time() - last_modified) < 15:
-                            continue
-                    except FileNotFoundError:
-                        # File might have been deleted during iteration
+                    if entry.name[:-4] + ".thumb.jpg" in thumbs:
+                        seen_files.add(video)
+                        continue
+                    waiting.append(video)
+                listed_mtime = dir_mtime
+                listed_at = time.monotonic()
+            
+            still_waiting = []
+            ready = []
+            for video in waiting:
+                # STABILITY CHECK:
+                # Skip files modified in the last 15 seconds.
+                # This ensures we don't try to read a file currently being written by the recorder.
+                try:
+                    last_modified = video.stat().st_mtime
+                    if (time.time() - last_modified) < 15:
+                        still_waiting.append(video)
                         continue
+                except FileNotFoundError:
+                    # File might have been deleted since the listing
+                    continue
+                ready.append(video)
 
-                    # Attempt generation synchronously to avoid spawning too many threads
-                    # and to ensure we know if it succeeded.
-                    if generate_thumbnail(video):
+            # Attempt generation synchronously to avoid spawning too many processes
+            # and to ensure we know if it succeeded.
+            for i in range(0, len(ready), THUMB_BATCH_SIZE):
+                batch = ready[i:i + THUMB_BATCH_SIZE]
+                done = generate_thumbnails(batch)
+                for video in batch:
+                    if video in done:
                         seen_files.add(video)
+                    else:
+                        still_waiting.append(video)
+            waiting = still_waiting
             
             time.sleep(10)  # Check every 10 seconds
             
@@ -110,6 +192,65 @@ def thumbnail_watcher():
             print(f"Thumbnail watcher error: {e}")
             time.sleep(30)
 
+def segment_order_key(name: str):
+    """
+    Chronological sort key for segment names (PM-01-18-00.mp4).
+    Plain string order is wrong for AM/PM and for hour 12, which comes first.
+    """
+    seconds = parse_segment_seconds(name)
+    if seconds is None:
+        raise ValueError(f"unexpected segment name: {name}")
+    return seconds
+
+def get_latest_write_time(day_path: Path) -> float:
+    """Returns the newest .mp4 mtime in day_path, or 0 if there are none."""
+    try:
+        with os.scandir(day_path) as it:
+            entries = [entry for entry in it if entry.name.endswith(".mp4")]
+    except FileNotFoundError:
+        return 0.0
+    if not entries:
+        return 0.0
+
+    # The newest segment is known from its name, so only it needs a stat
+    try:
+        newest = max(entries, key=lambda e: segment_order_key(e.name))
+        return newest.stat().st_mtime
+    except (ValueError, FileNotFoundError):
+        # Unexpected names, or the file vanished; stat them all
+        latest = 0.0
+        for entry in entries:
+            try:
+                latest = max(latest, entry.stat().st_mtime)
+            except FileNotFoundError:
+                pass
+        return latest
+
+def stop_process(process):
+    """Terminates ffmpeg, killing it if it doesn't exit within 5 seconds."""
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# How often the monitor loop checks settings, stalls and the midnight folder
+MONITOR_INTERVAL = 2
+
+def open_exit_fd(process):
+    """Returns a pidfd that becomes readable when process exits, or None if unsupported."""
+    try:
+        return os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        return None
+
+def wait_for_exit(exit_fd, timeout):
+    """Sleeps for up to timeout seconds, returning as soon as the process behind exit_fd exits."""
+    if exit_fd is None:
+        time.sleep(timeout)
+    else:
+        select.select([exit_fd], [], [], timeout)
+
 def get_seconds_until_midnight():
     """Calculates seconds remaining until the next midnight."""
     now = datetime.now()
@@ -128,9 +269,7 @@ def record_stream():
     thumb_thread.start()
 
     # Track last config mtime to detect changes
-    last_config_mtime = 0
-    if Config.SETTINGS_FILE.exists():
-        last_config_mtime = Config.SETTINGS_FILE.stat().st_mtime
+    last_config_mtime = Config.settings_mtime()
 
     while True:
         try:
@@ -158,38 +297,71 @@ def record_stream():
             cmd = [
                 "ffmpeg",
                 "-nostdin",
+                "-loglevel", "warning",
                 "-rtsp_transport", "tcp",
                 "-timeout", "5000000",
+                "-fflags", "+genpts",
                 "-i", rtsp_url
             ] + video_args + audio_args + [
                 "-map", "0",
+                "-avoid_negative_ts", "make_zero",
                 "-f", "segment",
                 "-segment_time", str(segment_time),
+                # Each segment starts at t=0 and is written as fragmented MP4,
+                # so it is playable while still recording and needs no rewrite
+                # pass on the Box mount when it closes
+                "-reset_timestamps", "1",
+                "-segment_format_options", "movflags=+frag_keyframe+empty_moov+default_base_moof",
                 "-strftime", "1",
                 "-t", str(duration),
                 file_template
             ]
 
             # Run FFmpeg
-            process = subprocess.Popen(cmd)
+            process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            started_at = time.time()
             print(f"FFmpeg started with PID {process.pid}")
+
+            # Restart if nothing has been written for two full segments
+            stall_limit = 2 * int(segment_time)
+            next_stall_check = started_at + stall_limit
+            tomorrow_ready = False
             
-            # Monitor process and config file
-            while process.poll() is None:
-                time.sleep(1)
+            # Monitor process and config file; an ffmpeg exit (e.g. the
+            # midnight -t cutoff) wakes the loop at once instead of on the next tick
+            exit_fd = open_exit_fd(process)
+            try:
+                while process.poll() is None:
+                    wait_for_exit(exit_fd, MONITOR_INTERVAL)
+                    if process.poll() is not None:
+                        break
                 
-                # Check for config change
-                if Config.SETTINGS_FILE.exists():
-                    current_mtime = Config.SETTINGS_FILE.stat().st_mtime
+                    # Check for config change
+                    current_mtime = Config.settings_mtime()
                     if current_mtime > last_config_mtime:
                         print("Config changed. Restarting recorder...")
                         last_config_mtime = current_mtime
-                        process.terminate()
-                        try:
-                            process.wait(timeout=5)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
+                        stop_process(process)
                         break
+
+                    now = time.time()
+                    if now >= next_stall_check:
+                        next_stall_check = now + 30
+                        last_write = get_latest_write_time(today_path)
+                        if now - max(last_write, started_at) > stall_limit:
+                            print(f"No segment written for {stall_limit}s. Restarting recorder...")
+                            stop_process(process)
+                            break
+
+                    # Create tomorrow's folder ahead of time so the post-midnight
+                    # restart starts writing immediately
+                    if not tomorrow_ready and get_seconds_until_midnight() <= 60:
+                        tomorrow = datetime.now() + timedelta(days=1)
+                        (full_path / tomorrow.strftime("%Y/%m/%d")).mkdir(parents=True, exist_ok=True)
+                        tomorrow_ready = True
+            finally:
+                if exit_fd is not None:
+                    os.close(exit_fd)
             
             print("FFmpeg exited. Restarting in 2 seconds...")
             time.sleep(2)
@@ -1,21 +1,87 @@
+import math
 import time
 import subprocess
 import sys
 import os
 from datetime import datetime, timedelta
-from pathlib import Path
-from .config import Config
+from .config import Config, parse_segment_seconds
 
 DEFAULT_SPEED_MULTIPLIER = 200
 MIN_SPEED_MULTIPLIER = 10
 MAX_SPEED_MULTIPLIER = 2000
 
+# H.264 encoder for timelapses. libx264 (software) works everywhere; the
+# hardware encoders need their GPU/codec device passed into the container
+TIMELAPSE_ENCODER = os.getenv("TIMELAPSE_ENCODER", "libx264")
+
+def _cpu_budget():
+    """CPUs this container may use: its affinity mask, capped by any cgroup v2 CPU quota."""
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+# ffmpeg sizes its thread pools from the affinity mask but not from a
+# Docker --cpus quota, so with a quota it starts more threads than it gets
+# CPU time for. Pass the real budget to the software decoder and x264
+SOFTWARE_THREAD_ARGS = ["-threads", str(_cpu_budget())]
+
+# Encoder arguments, all tuned for speed over file size
+ENCODER_ARGS = {
+    "libx264": [
+        "-c:v", "libx264",
+        "-pix_fmt", "yuv420p",
+        *SOFTWARE_THREAD_ARGS,
+        "-preset", "ultrafast",  # Max speed, larger file size
+        "-crf", "30",            # Lower quality slightly to offset file size bloat
+    ],
+    # Frames arrive in GPU memory (see DECODER_ARGS), so no -pix_fmt here:
+    # a software format conversion would force a download and re-upload
+    "h264_nvenc": ["-c:v", "h264_nvenc", "-preset", "p1", "-rc", "vbr", "-cq", "30"],
+    "h264_qsv": ["-c:v", "h264_qsv", "-preset", "veryfast", "-global_quality", "30"],
+    "h264_vaapi": ["-c:v", "h264_vaapi", "-qp", "30"],
+    "h264_v4l2m2m": ["-c:v", "h264_v4l2m2m", "-pix_fmt", "yuv420p", "-b:v", "8M"],
+}
+
+# Input (decode) arguments matched to each encoder. The GPU encoders decode
+# on the same device and keep frames there from decode through setpts to
+# encode, instead of copying every frame to system memory and back
+DECODER_ARGS = {
+    "libx264": SOFTWARE_THREAD_ARGS,  # Software decode, sized to the CPU budget
+    "h264_nvenc": ["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+    "h264_qsv": ["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"],
+    "h264_vaapi": ["-hwaccel", "vaapi", "-hwaccel_device", "/dev/dri/renderD128",
+                   "-hwaccel_output_format", "vaapi"],
+    # The Pi's stateful V4L2 codec is a decoder, not an hwaccel
+    "h264_v4l2m2m": ["-c:v", "h264_v4l2m2m"],
+}
+
+if TIMELAPSE_ENCODER not in ENCODER_ARGS:
+    print(f"Unknown TIMELAPSE_ENCODER '{TIMELAPSE_ENCODER}'; using libx264")
+    TIMELAPSE_ENCODER = "libx264"
+
+# At this speed or above, one output frame (at 30fps) spans more recording
+# time than the camera's keyframe interval (2-4s), so decoding only keyframes
+# yields the same timelapse while skipping almost all of the decode work.
+# Range timelapses concatenate already-encoded timelapses, whose keyframes
+# are much sparser, so they always decode every frame
+KEYFRAME_ONLY_MIN_SPEED = 120
+
+# How often a running encode logs its progress and re-checks the Box mount
+PROGRESS_REPORT_SECONDS = 30
+
 def wait_for_box():
     """Waits for the Box mount to be available and writable."""
     print("Waiting for Box mount at /data/box...")
     max_attempts = 60
     for i in range(max_attempts):
-        if Config.BOX_ROOT.exists() and os.access(Config.BOX_ROOT, os.W_OK):
+        # access() is False for a missing path too, so one call covers both checks
+        if os.access(Config.BOX_ROOT, os.W_OK):
             print("Box mount is ready!")
             return True
         print(f"Waiting... ({i+1}/{max_attempts})")
@@ -35,44 +101,69 @@ def get_seconds_until_next_run():
         # If it's already past 12:05 AM, schedule for tomorrow
         target += timedelta(days=1)
         
-    return int((target - now).total_seconds())
-
-def _parse_recording_timestamp(target_date, video_path: Path) -> datetime | None:
-    """Parse a recording filename into a datetime for reliable ordering."""
-    try:
-        # File format from recorder: "%p-%I-%M-%S.mp4" (e.g., AM-01-02-03.mp4)
-        return datetime.strptime(
-            f"{target_date.strftime('%Y-%m-%d')} {video_path.stem}",
-            "%Y-%m-%d %p-%I-%M-%S",
-        )
-    except ValueError:
-        return None
-
+    # Rounded up so now + this never lands just before 12:05 and triggers a second run
+    return math.ceil((target - now).total_seconds())
 
-def _sort_recordings(target_date, files):
-    def sort_key(video_path: Path):
-        parsed = _parse_recording_timestamp(target_date, video_path)
-        if parsed is not None:
-            return parsed.timestamp()
-        try:
-            return video_path.stat().st_mtime
-        except FileNotFoundError:
-            return 0
+# Longest single sleep while waiting for the next run; the wall clock is
+# re-read after each one
+SLEEP_CHECK_SECONDS = 60
 
-    return sorted(files, key=sort_key)
+def sleep_until(target):
+    """
+    Sleeps until the wall-clock time target. time.sleep() counts elapsed
+    time, so a day-long sleep drifts across NTP steps, DST changes and
+    host suspends; re-checking the clock keeps the wakeup on time.
+    """
+    while True:
+        remaining = (target - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, SLEEP_CHECK_SECONDS))
+
+
+def _scan_recordings(source_dir):
+    """Lists (name, stat_result) for every .mp4 in source_dir with one scandir pass."""
+    recordings = []
+    with os.scandir(source_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(".mp4"):
+                continue
+            try:
+                recordings.append((entry.name, entry.stat()))
+            except FileNotFoundError:
+                print(f"Skipping missing recording: {entry.name}")
+    return recordings
+
+
+def _sort_recordings(target_date, recordings):
+    # Names give the time of day; midnight anchors them so recordings with
+    # unparsable names can be ordered by their mtime alongside
+    day_start = datetime.combine(target_date, datetime.min.time()).timestamp()
+
+    def sort_key(recording):
+        name, st = recording
+        seconds = parse_segment_seconds(name)
+        if seconds is not None:
+            return day_start + seconds
+        return st.st_mtime
+
+    return sorted(recordings, key=sort_key)
+
+
+def _filter_valid_recordings(recordings):
+    valid_recordings = []
+    for name, st in recordings:
+        if st.st_size > 0:
+            valid_recordings.append((name, st))
+        else:
+            print(f"Skipping empty recording: {name}")
+    return valid_recordings
 
 
-def _filter_valid_recordings(files):
-    valid_files = []
-    for video_path in files:
-        try:
-            if video_path.stat().st_size > 0:
-                valid_files.append(video_path)
-            else:
-                print(f"Skipping empty recording: {video_path.name}")
-        except FileNotFoundError:
-            print(f"Skipping missing recording: {video_path.name}")
-    return valid_files
+def _playlist_text(paths):
+    """Concat-demuxer playlist for paths, built as one string to pipe into ffmpeg."""
+    # FFmpeg concat requires 'file ' prefix and quoted paths
+    return "".join("file '" + str(path).replace("'", "'\\''") + "'\n" for path in paths)
 
 
 def _normalize_speed_multiplier(speed_multiplier):
@@ -85,27 +176,86 @@ def _normalize_speed_multiplier(speed_multiplier):
     return max(MIN_SPEED_MULTIPLIER, min(MAX_SPEED_MULTIPLIER, speed))
 
 
-def _build_ffmpeg_command(playlist_path, output_file, speed_multiplier):
+def _build_ffmpeg_command(output_file, speed_multiplier, encoder=TIMELAPSE_ENCODER, from_recordings=False):
     speed = _normalize_speed_multiplier(speed_multiplier)
+    skip_args = ["-skip_frame", "nokey"] if from_recordings and speed >= KEYFRAME_ONLY_MIN_SPEED else []
     return [
         "ffmpeg",
         "-nostdin",
-        "-hwaccel", "auto",      # Attempt hardware acceleration
+        # Machine-readable progress on stdout instead of the stats line
+        "-progress", "pipe:1",
+        "-nostats",
+        *DECODER_ARGS[encoder],
         "-f", "concat",
         "-safe", "0",
-        "-i", str(playlist_path),
+        # The playlist arrives on stdin; the files it lists are opened normally
+        "-protocol_whitelist", "file,pipe",
+        *skip_args,
+        "-i", "pipe:0",
         "-filter:v", f"setpts=PTS/{speed}",
         "-an",
-        "-c:v", "libx264",
-        "-pix_fmt", "yuv420p",
-        "-preset", "ultrafast",  # Max speed, larger file size
+        *ENCODER_ARGS[encoder],
         "-r", "30",              # Cap framerate to 30fps
-        "-crf", "30",            # Lower quality slightly to offset file size bloat
         "-y",
         str(output_file)
     ]
 
 
+class BoxMountLost(Exception):
+    """The Box mount went away mid-encode; retrying against it would only stall."""
+
+
+def _encode(cmd, playlist):
+    """
+    Runs one ffmpeg encode fed the playlist on stdin, logging its progress
+    and stopping it early if the Box mount goes away.
+    Raises CalledProcessError if ffmpeg fails, like subprocess.run(check=True),
+    or BoxMountLost if it was stopped because the mount disappeared.
+    """
+    with subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) as process:
+        # ffmpeg reads the whole playlist before it reports any progress
+        try:
+            process.stdin.write(playlist)
+            process.stdin.close()
+        except BrokenPipeError:
+            pass # ffmpeg already exited; its return code says why
+
+        mount_lost = False
+        out_time = None
+        next_report = time.monotonic() + PROGRESS_REPORT_SECONDS
+        for line in process.stdout:
+            key, _, value = line.rstrip().partition("=")
+            if key == "out_time":
+                out_time = value
+            elif key == "progress" and time.monotonic() >= next_report:
+                next_report = time.monotonic() + PROGRESS_REPORT_SECONDS
+                print(f"Timelapse progress: {out_time} of output encoded")
+                if not os.access(Config.BOX_ROOT, os.W_OK):
+                    print("Box mount went away. Stopping ffmpeg...")
+                    process.terminate()
+                    mount_lost = True
+                    break
+
+    if mount_lost:
+        raise BoxMountLost("Box mount went away during the encode")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
+def _run_ffmpeg(playlist, output_file, speed_multiplier, from_recordings=False):
+    """
+    Encodes the timelapse from a playlist string, retrying with libx264 if the
+    hardware encoder fails. A lost Box mount (BoxMountLost) is not retried.
+    """
+    try:
+        _encode(_build_ffmpeg_command(output_file, speed_multiplier, from_recordings=from_recordings), playlist)
+    except subprocess.CalledProcessError:
+        if TIMELAPSE_ENCODER == "libx264":
+            raise
+        print(f"{TIMELAPSE_ENCODER} encode failed; retrying with libx264")
+        _encode(_build_ffmpeg_command(output_file, speed_multiplier, "libx264", from_recordings), playlist)
+
+
 def generate_timelapse(target_date=None, force=False, speed_multiplier=None):
     """
     Main logic to generate the timelapse.
@@ -150,8 +300,8 @@ def generate_timelapse(target_date=None, force=False, speed_multiplier=None):
         print(msg)
         return {"success": False, "message": msg}
 
-    # 1. Scan and Sort
-    files = list(source_dir.glob("*.mp4"))
+    # 1. Scan and Sort (one listing; sizes and mtimes come from its stats)
+    files = _scan_recordings(source_dir)
     if not files:
         msg = f"No .mp4 files found for {target_date}."
         print(msg)
@@ -167,24 +317,16 @@ def generate_timelapse(target_date=None, force=False, speed_multiplier=None):
 
     print(f"Found {len(files)} videos.")
 
-    # 2. Create Playlist
-    playlist_path = source_dir / "playlist.txt"
+    # 2. Create Playlist (piped to ffmpeg; nothing is written to the mount)
+    # Since we are running locally, absolute paths are fine; the directory
+    # part is the same for every recording, so it is built once
+    prefix = os.path.join(os.path.abspath(source_dir), "")
+    playlist = _playlist_text(prefix + name for name, _ in files)
     try:
-        with open(playlist_path, "w") as f:
-            for video in files:
-                # FFmpeg concat requires 'file ' prefix and safe paths
-                # Since we are running locally, absolute paths are fine.
-                path_str = str(video.absolute()).replace("'", "'\\''")
-                f.write(f"file '{path_str}'\n")
-        
-        print(f"Created playlist at {playlist_path}")
-
         # 3. Run FFmpeg
         print(f"Starting timelapse generation -> {output_file}")
-        cmd = _build_ffmpeg_command(playlist_path, output_file, speed_multiplier)
-        
         start_time = time.time()
-        subprocess.run(cmd, check=True)
+        _run_ffmpeg(playlist, output_file, speed_multiplier, from_recordings=True)
         duration = time.time() - start_time
         
         msg = f"Timelapse created successfully in {duration:.2f} seconds!"
@@ -199,11 +341,6 @@ def generate_timelapse(target_date=None, force=False, speed_multiplier=None):
         msg = f"Error during timelapse generation: {e}"
         print(msg)
         return {"success": False, "message": msg}
-    finally:
-        # 4. Cleanup
-        if playlist_path.exists():
-            playlist_path.unlink()
-            print("Cleaned up playlist.txt")
 
 
 def generate_timelapse_range(start_date, end_date, force=False, speed_multiplier=None):
@@ -244,19 +381,12 @@ def generate_timelapse_range(start_date, end_date, force=False, speed_multiplier
         print(msg)
         return {"success": False, "message": msg}
 
-    playlist_path = output_dir / f"playlist_range_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.txt"
+    playlist = _playlist_text(video.absolute() for video in files)
     try:
-        with open(playlist_path, "w") as f:
-            for video in files:
-                path_str = str(video.absolute()).replace("'", "'\\''")
-                f.write(f"file '{path_str}'\n")
-
-        print(f"Created range playlist at {playlist_path}")
         print(f"Starting range timelapse generation -> {output_file}")
 
-        cmd = _build_ffmpeg_command(playlist_path, output_file, speed_multiplier)
         start_time = time.time()
-        subprocess.run(cmd, check=True)
+        _run_ffmpeg(playlist, output_file, speed_multiplier)
         duration = time.time() - start_time
 
         missing_msg = ""
@@ -277,10 +407,6 @@ def generate_timelapse_range(start_date, end_date, force=False, speed_multiplier
         msg = f"Error during range timelapse generation: {e}"
         print(msg)
         return {"success": False, "message": msg}
-    finally:
-        if playlist_path.exists():
-            playlist_path.unlink()
-            print("Cleaned up range playlist")
 
 def main():
     # Flush stdout for Docker logs
@@ -296,7 +422,7 @@ def main():
         next_run_time = datetime.now() + timedelta(seconds=seconds_to_sleep)
         
         print(f"Sleeping for {seconds_to_sleep} seconds. Next run at {next_run_time}")
-        time.sleep(seconds_to_sleep)
+        sleep_until(next_run_time)
         
         print("Waking up for daily timelapse job...")
         generate_timelapse()